@@ -7,49 +7,235 @@ Bridges TCP NMEA streams to WebSocket clients
 import asyncio
 import websockets
 import socket
-import json
+import orjson
+import msgspec
 import logging
 import argparse
+import sys
+import time
 from datetime import datetime
-from typing import Dict, Set, Optional, Tuple
+from typing import Annotated, Dict, Set, Optional, Tuple, Union
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None  # Optional, the default asyncio event loop is used instead
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Subprotocol clients can request to receive MessagePack instead of JSON frames
+MSGPACK_SUBPROTOCOL = 'nmea-msgpack'
+
+# Maximum bytes taken from the TCP source per read
+TCP_READ_SIZE = 65536
+
+# Upper bound on sentences coalesced into one nmea_batch frame
+NMEA_BATCH_MAX = 256
+
+# Kernel receive buffer requested for TCP sources, only if net.core.rmem_max allows it on Linux
+TCP_RCVBUF_SIZE = 2 * 1024 * 1024
+
+# Frames queued for one subscriber before it is dropped as too slow
+SUBSCRIBER_QUEUE_SIZE = 128
+
+# Longest partial line held back while waiting for its newline, longer ones are discarded
+TCP_LINE_LIMIT = 2 ** 20
+
+class NmeaFrame(msgspec.Struct, tag='nmea', tag_field='type'):
+    """NMEA sentence frame (MessagePack wire format)"""
+    sentence: str
+    timestamp: int  # Nanoseconds since epoch
+
+class NmeaBatchFrame(msgspec.Struct, tag='nmea_batch', tag_field='type'):
+    """Several NMEA sentences from one TCP read (MessagePack wire format)"""
+    sentences: list[str]
+    timestamp: int  # Nanoseconds since epoch
+
+class CtrlFrame(msgspec.Struct, omit_defaults=True):
+    """Control frame sent to a client (MessagePack wire format)"""
+    type: str
+    message: Optional[str] = None
+    ip: Optional[str] = None
+    port: Optional[int] = None
+    timestamp: Optional[int] = None  # Nanoseconds since epoch
+
+class ControlMsg(msgspec.Struct, tag_field='type'):
+    """Request from a client, the subclass is picked by its 'type' field"""
+
+class Connect(ControlMsg, tag='connect'):
+    ip: Annotated[str, msgspec.Meta(min_length=1)]
+    port: Annotated[int, msgspec.Meta(ge=1, le=65535)]
+
+class Disconnect(ControlMsg, tag='disconnect'):
+    pass
+
+class Ping(ControlMsg, tag='ping'):
+    pass
+
+_ENCODER = msgspec.msgpack.Encoder()
+
+# Decode and validate client requests in one pass; strict=False still accepts a numeric string port
+_DECODER = msgspec.json.Decoder(Union[Connect, Disconnect, Ping], strict=False)
+_MSGPACK_DECODER = msgspec.msgpack.Decoder(Union[Connect, Disconnect, Ping], strict=False)
+
+# Pre-serialized pieces of the JSON NMEA frame; only sentence and timestamp vary
+_NMEA_PREFIX = b'{"type":"nmea","sentence":"'
+_NMEA_MID = b'","timestamp":'
+_NMEA_SUFFIX = b'}'
+
+# Control frames that are fixed apart from the timestamp, with their message
+_FIXED_FRAMES = {
+    'welcome': 'NMEA WebSocket Proxy Server Connected',
+    'pong': None,
+    'disconnected': 'Disconnected from TCP source',
+    'tcp_disconnected': 'TCP connection closed',
+}
+
+# Pre-serialized pieces of the JSON connected and error frames
+_CONNECTED_PREFIX = b'{"type":"connected","ip":'
+_CONNECTED_SUFFIX = b',"port":%d,"timestamp":%d}'
+_ERROR_PREFIX = b'{"type":"error","message":'
+_ERROR_MID = b',"timestamp":'
+_ERROR_SUFFIX = b'}'
+
+# Translate table deleting characters that would need escaping in a JSON string
+_JSON_UNSAFE = dict.fromkeys([*range(0x20), ord('"'), ord('\\')])
+
+# Translate table escaping those same characters
+_JSON_ESCAPES = {c: f'\\u{c:04x}' for c in range(0x20)}
+_JSON_ESCAPES.update({ord('"'): '\\"', ord('\\'): '\\\\'})
+
+def _dumps(o) -> bytes:
+    """Serialize a frame to JSON bytes (sent as-is, no extra UTF-8 encode)"""
+    return orjson.dumps(o)
+
+def _json_str(s: str) -> bytes:
+    """Encode a str as a JSON string literal"""
+    if s.isascii():
+        return b'"' + s.translate(_JSON_ESCAPES).encode() + b'"'
+    return orjson.dumps(s)
+
+# JSON fixed frames serialized up to the timestamp value, which is appended with '}'
+_FIXED_PREFIXES = {
+    frame_type: _dumps({'type': frame_type, 'message': message} if message else {'type': frame_type})[:-1]
+    + b',"timestamp":'
+    for frame_type, message in _FIXED_FRAMES.items()
+}
+
+def _decode_msgpack(message) -> ControlMsg:
+    """Decode a MessagePack client request, which only a binary frame can carry"""
+    if isinstance(message, str):
+        raise msgspec.DecodeError("MessagePack request sent as a text frame")
+    return _MSGPACK_DECODER.decode(message)
+
+def _select_subprotocol(connection, subprotocols):
+    """Pick MessagePack if offered, otherwise continue with plain JSON"""
+    if MSGPACK_SUBPROTOCOL in subprotocols:
+        return MSGPACK_SUBPROTOCOL
+    return None
+
+def _rcvbuf_fits() -> bool:
+    """Whether the kernel grants TCP_RCVBUF_SIZE in full"""
+    if not sys.platform.startswith('linux'):
+        return True
+    try:
+        with open('/proc/sys/net/core/rmem_max') as f:
+            return int(f.read()) >= TCP_RCVBUF_SIZE
+    except (OSError, ValueError):
+        return False
+
+def _tune_tcp_socket(sock):
+    """Enlarge the receive buffer and disable send delays on a TCP source socket"""
+    try:
+        # On Linux a fixed SO_RCVBUF turns off receive buffer autotuning, and
+        # a request clamped by rmem_max ends up smaller than autotuning grows to
+        if _rcvbuf_fits():
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, TCP_RCVBUF_SIZE)
+        # asyncio already sets TCP_NODELAY on connect, set here too so it
+        # doesn't depend on the event loop in use
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except OSError as e:
+        logger.debug(f"Could not tune TCP socket: {e}")
+
+def _ts() -> int:
+    """Current time as integer nanoseconds since epoch, the timestamp of every frame"""
+    return time.time_ns()
+
+class ConnState:
+    """Per WebSocket client state, slotted since there is one per connection"""
+    __slots__ = ('ip', 'port', 'connected', 'start_time', 'client_ip', 'source', 'queue', 'sender_task')
+
+    def __init__(self, client_ip: str):
+        self.ip: Optional[str] = None
+        self.port: Optional[int] = None
+        self.connected = False
+        self.start_time = datetime.now()
+        self.client_ip = client_ip
+        self.source: Optional['SourceState'] = None  # TCP source subscribed to
+        self.queue: Optional[asyncio.Queue] = None  # Frames waiting for this client
+        self.sender_task: Optional[asyncio.Task] = None  # Outlives reset() while draining the queue
+
+    def reset(self):
+        """Mark the client as no longer attached to a TCP source"""
+        self.connected = False
+        self.ip = None
+        self.port = None
+        self.source = None
+        self.queue = None
+
+    def stop_sender(self):
+        """Cancel the sender task, discarding any frames still queued"""
+        if self.sender_task is not None:
+            self.sender_task.cancel()
+            self.sender_task = None
+
+class SourceState:
+    """A TCP NMEA source shared by every WebSocket client subscribed to it"""
+    def __init__(self, ip: str, port: int, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.ip = ip
+        self.port = port
+        self.reader = reader
+        self.writer = writer
+        self.reader_task: Optional[asyncio.Task] = None
+        # Doubles as the reference count, the source is closed when it empties
+        self.subscribers: Dict[websockets.WebSocketServerProtocol, ConnState] = {}
+
 class NMEAWebSocketProxy:
     def __init__(self, ws_port: int = 8080, allowed_origins: Set[str] = None):
         self.ws_port = ws_port
-        self.allowed_origins = allowed_origins or {'*'}
-        self.active_connections: Dict[websockets.WebSocketServerProtocol, dict] = {}
-        self.tcp_tasks: Dict[websockets.WebSocketServerProtocol, asyncio.Task] = {}
+        self.allowed_origins = frozenset(allowed_origins or ('*',))
+        self._allow_all = '*' in self.allowed_origins
+        self.active_connections: Dict[websockets.WebSocketServerProtocol, ConnState] = {}
+        self.sources: Dict[Tuple[str, int], SourceState] = {}
+        self._connected = 0  # Clients attached to a TCP source, kept in step with ConnState.connected
+        self._background: Set[asyncio.Task] = set()  # Fire-and-forget tasks, kept referenced until done
+        # Reused JSON envelopes for the orjson fallback path, refilled on each encode
+        self._nmea_envelope = {'type': 'nmea', 'sentence': None, 'timestamp': None}
+        self._batch_envelope = {'type': 'nmea_batch', 'sentences': None, 'timestamp': None}
 
     async def handle_client(self, websocket):
         """Handle new WebSocket client connection"""
         client_ip = websocket.remote_address[0] if websocket.remote_address else 'unknown'
         logger.info(f"WebSocket client connected from {client_ip}")
         
-        self.active_connections[websocket] = {
-            'ip': None,
-            'port': None,
-            'connected': False,
-            'start_time': datetime.now(),
-            'client_ip': client_ip
-        }
+        self.active_connections[websocket] = ConnState(client_ip)
 
         try:
             # Send welcome message
-            await websocket.send(json.dumps({
-                'type': 'welcome',
-                'message': 'NMEA WebSocket Proxy Server Connected',
-                'timestamp': datetime.now().isoformat()
-            }))
+            await self.send_control(websocket, 'welcome')
 
+            if websocket.subprotocol == MSGPACK_SUBPROTOCOL:
+                decode, wire_format = _decode_msgpack, 'MessagePack'
+            else:
+                decode, wire_format = _DECODER.decode, 'JSON'
             async for message in websocket:
                 try:
-                    data = json.loads(message)
-                    await self.handle_message(websocket, data)
-                except json.JSONDecodeError:
-                    await self.send_error(websocket, "Invalid JSON format")
+                    await self.dispatch(websocket, decode(message))
+                except msgspec.ValidationError as e:
+                    await self.send_error(websocket, f"Invalid message: {e}")
+                except msgspec.DecodeError:
+                    await self.send_error(websocket, f"Invalid {wire_format} format")
                 except Exception as e:
                     logger.error(f"Error handling message: {e}")
                     await self.send_error(websocket, f"Server error: {str(e)}")
@@ -61,156 +247,313 @@ class NMEAWebSocketProxy:
         finally:
             await self.cleanup_connection(websocket)
 
-    async def handle_message(self, websocket, data: dict):
-        """Handle incoming WebSocket messages"""
-        message_type = data.get('type')
-        
-        if message_type == 'connect':
-            ip = data.get('ip')
-            port = data.get('port')
-            if ip and port:
-                await self.connect_tcp_source(websocket, ip, int(port))
-            else:
-                await self.send_error(websocket, "Missing IP or port")
-                
-        elif message_type == 'disconnect':
+    async def dispatch(self, websocket, msg: ControlMsg):
+        """Handle a decoded WebSocket client request"""
+        if isinstance(msg, Connect):
+            await self.connect_tcp_source(websocket, msg.ip, msg.port)
+        elif isinstance(msg, Disconnect):
             await self.disconnect_tcp_source(websocket)
-            
-        elif message_type == 'ping':
-            await websocket.send(json.dumps({
-                'type': 'pong',
-                'timestamp': datetime.now().isoformat()
-            }))
-            
-        else:
-            await self.send_error(websocket, f"Unknown message type: {message_type}")
+        elif isinstance(msg, Ping):
+            await self.send_control(websocket, 'pong')
 
     async def connect_tcp_source(self, websocket, ip: str, port: int):
-        """Connect to TCP NMEA source"""
+        """Connect to TCP NMEA source, sharing it if another client already has"""
         # Disconnect existing connection if any
-        if websocket in self.tcp_tasks:
+        if self.active_connections[websocket].source is not None:
             await self.disconnect_tcp_source(websocket)
 
-        logger.info(f"Attempting to connect to TCP source: {ip}:{port}")
+        key = (ip, port)
+        source = self.sources.get(key)
+        if source is None:
+            logger.info(f"Attempting to connect to TCP source: {ip}:{port}")
+
+            try:
+                # Create TCP connection
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(ip, port),
+                    timeout=10.0
+                )
+            except asyncio.TimeoutError:
+                await self.send_error(websocket, f"Connection timeout to {ip}:{port}")
+                return
+            except ConnectionRefusedError:
+                await self.send_error(websocket, f"Connection refused to {ip}:{port}")
+                return
+            except Exception as e:
+                logger.error(f"TCP connection error: {e}")
+                await self.send_error(websocket, f"Connection error: {str(e)}")
+                return
 
-        try:
-            # Create TCP connection
-            reader, writer = await asyncio.wait_for(
-                asyncio.open_connection(ip, port),
-                timeout=10.0
-            )
-            
             logger.info(f"Connected to TCP source: {ip}:{port}")
-            
-            # Update connection info
-            self.active_connections[websocket].update({
-                'ip': ip,
-                'port': port,
-                'connected': True,
-                'tcp_writer': writer
-            })
-
-            # Send confirmation
-            await websocket.send(json.dumps({
-                'type': 'connected',
-                'ip': ip,
-                'port': port,
-                'timestamp': datetime.now().isoformat()
-            }))
-
-            # Start TCP reading task
-            self.tcp_tasks[websocket] = asyncio.create_task(
-                self.tcp_reader_task(websocket, reader, writer, ip, port)
-            )
-
-        except asyncio.TimeoutError:
-            await self.send_error(websocket, f"Connection timeout to {ip}:{port}")
-        except ConnectionRefusedError:
-            await self.send_error(websocket, f"Connection refused to {ip}:{port}")
-        except Exception as e:
-            logger.error(f"TCP connection error: {e}")
-            await self.send_error(websocket, f"Connection error: {str(e)}")
+            _tune_tcp_socket(writer.get_extra_info('socket'))
+
+            source = self.sources.get(key)
+            if source is None:
+                source = SourceState(ip, port, reader, writer)
+                self.sources[key] = source
+            else:
+                # Another client opened the same source while we were connecting
+                writer.close()
+        else:
+            logger.info(f"Sharing TCP source {ip}:{port} with {len(source.subscribers)} other client(s)")
+
+        # Update connection info
+        connection = self.active_connections[websocket]
+        connection.source = source
+        connection.ip = ip
+        connection.port = port
+        connection.connected = True
+        connection.queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        source.subscribers[websocket] = connection
+        self._connected += 1
 
-    async def tcp_reader_task(self, websocket, reader, writer, ip: str, port: int):
-        """Task to read from TCP connection and forward to WebSocket"""
-        buffer = ""
+        # Send confirmation, then start forwarding whatever was queued meanwhile
+        await self.send_control(websocket, 'connected', ip=ip, port=port)
+        if connection.source is source:
+            connection.stop_sender()  # One still draining a previous source
+            connection.sender_task = asyncio.create_task(
+                self.subscriber_sender_task(source, websocket, connection.queue))
+
+        # Start TCP reading task once the first subscriber is confirmed
+        if source.reader_task is None:
+            source.reader_task = asyncio.create_task(self.tcp_reader_task(source))
+
+    async def tcp_reader_task(self, source: SourceState):
+        """Task to read from TCP connection and forward to all subscribed WebSockets"""
+        # Bound once as locals, these are looked up for every chunk and line
+        read = source.reader.read
+        broadcast = self.broadcast_nmea
+        tail = bytearray()  # Unterminated last line, carried over to the next read
+        skipping = False  # Inside an overlong line, dropping bytes up to its newline
         
         try:
-            while True:
-                data = await reader.read(1024)
+            while source.subscribers:
+                data = await read(TCP_READ_SIZE)
                 if not data:
-                    logger.info(f"TCP connection closed by server: {ip}:{port}")
+                    logger.info(f"TCP connection closed by server: {source.ip}:{source.port}")
                     break
                 
-                buffer += data.decode('utf-8', errors='ignore')
-                
-                # Process complete lines
-                while '\n' in buffer:
-                    line, buffer = buffer.split('\n', 1)
-                    line = line.strip()
+                nl = data.find(b'\n')
+                if nl < 0:
+                    # No line ends in this read, it all belongs to the carried-over one
+                    if not skipping:
+                        tail += data
+                        if len(tail) > TCP_LINE_LIMIT:
+                            logger.warning(f"Discarding overlong line from {source.ip}:{source.port}")
+                            tail.clear()
+                            skipping = True
+                    continue
+
+                # Collect the complete lines of this read into one batch, so a
+                # busy feed gets fewer, larger frames and a quiet one single ones
+                batch = []
+                append = batch.append
+                if skipping:
+                    skipping = False
+                    offset = nl + 1
+                elif tail:
+                    # Finish the carried-over line on its own rather than
+                    # copying the whole read onto the end of it
+                    tail += data[:nl]
+                    if tail[-1:] == b'\r':
+                        del tail[-1]
+                    if tail[:1] in (b'!', b'$'):
+                        append(tail.decode('ascii', errors='ignore'))
+                    tail.clear()
+                    offset = nl + 1
+                else:
+                    offset = 0
+                find = data.find
+                while True:
+                    nl = find(b'\n', offset)
+                    if nl < 0:
+                        break
+                    start = offset
+                    offset = nl + 1
+                    # Only lines starting with '!' or '$' are NMEA, skip the rest undecoded
+                    if start == nl or data[start] not in (0x21, 0x24):
+                        continue
+                    end = nl - 1 if data[nl - 1] == 0x0D else nl  # Drop CR of CRLF
                     
-                    if line and (line.startswith('!') or line.startswith('$')):
-                        # Send NMEA sentence to WebSocket client
-                        try:
-                            await websocket.send(json.dumps({
-                                'type': 'nmea',
-                                'sentence': line,
-                                'timestamp': datetime.now().isoformat()
-                            }))
-                        except websockets.exceptions.ConnectionClosedError:
-                            logger.info("WebSocket client disconnected during TCP read")
-                            break
+                    # NMEA is ASCII, decode just this line
+                    append(data[start:end].decode('ascii', errors='ignore'))
+                    if len(batch) == NMEA_BATCH_MAX:
+                        broadcast(source, batch)
+                        batch = []
+                        append = batch.append
+
+                # Forward the complete lines now and carry the partial one
+                # over, rather than wait for it to finish
+                if offset < len(data):
+                    tail += data[offset:]
+
+                if batch:
+                    broadcast(source, batch)
 
         except Exception as e:
             logger.error(f"TCP reader error: {e}")
-            await self.send_error(websocket, f"TCP read error: {str(e)}")
+            for websocket in list(source.subscribers):
+                await self.send_error(websocket, f"TCP read error: {str(e)}")
         finally:
-            writer.close()
-            await writer.wait_closed()
+            # Detach everything before awaiting so a concurrent disconnect
+            # can't release the source a second time
+            key = (source.ip, source.port)
+            if self.sources.get(key) is source:
+                del self.sources[key]
+            subscribers = list(source.subscribers.items())
+            source.subscribers.clear()
+            unqueued = []
+            for websocket, connection in subscribers:
+                if not connection.connected:
+                    continue
+                queue = connection.queue
+                connection.reset()
+                self._connected -= 1
+                # Let the sender deliver what is queued, then tcp_disconnected
+                if connection.sender_task is not None:
+                    try:
+                        queue.put_nowait(None)
+                        continue
+                    except asyncio.QueueFull:
+                        connection.stop_sender()
+                unqueued.append(websocket)
+
+            source.writer.close()
+            await source.writer.wait_closed()
             
-            # Notify WebSocket client of disconnection
-            try:
-                await websocket.send(json.dumps({
-                    'type': 'tcp_disconnected',
-                    'message': 'TCP connection closed',
-                    'timestamp': datetime.now().isoformat()
-                }))
-            except:
-                pass  # WebSocket might be closed
+            # Notify WebSocket clients the sender can't reach of disconnection
+            for websocket in unqueued:
+                try:
+                    await self.send_control(websocket, 'tcp_disconnected')
+                except:
+                    pass  # WebSocket might be closed
 
-    async def disconnect_tcp_source(self, websocket):
-        """Disconnect from TCP source"""
-        if websocket in self.tcp_tasks:
-            task = self.tcp_tasks[websocket]
-            task.cancel()
+    def broadcast_nmea(self, source: SourceState, sentences: list):
+        """Encode NMEA sentences once per wire format and queue them for every subscriber"""
+        # Never awaits a client, so one that stops reading can't stall the others
+        frames = {}
+        slow = None
+        for websocket, connection in source.subscribers.items():
+            use_msgpack = websocket.subprotocol == MSGPACK_SUBPROTOCOL
+            frame = frames.get(use_msgpack)
+            if frame is None:
+                frame = frames[use_msgpack] = self.encode_nmea(sentences, use_msgpack)
             try:
-                await task
-            except asyncio.CancelledError:
-                pass
-            del self.tcp_tasks[websocket]
+                connection.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                if slow is None:
+                    slow = []
+                slow.append(websocket)
+
+        if slow:
+            for websocket in slow:
+                self.drop_subscriber(source, websocket, "not keeping up")
+                # Close it rather than leave a client that silently gets no data
+                self.spawn(websocket.close(1013, "Not keeping up with TCP source"))
+
+    async def subscriber_sender_task(self, source: SourceState, websocket, queue: asyncio.Queue):
+        """Task to send one subscriber the frames queued for it by broadcast_nmea"""
+        get = queue.get
+        send = websocket.send
+        try:
+            # None is queued by the reader once the TCP source has closed
+            while (frame := await get()) is not None:
+                await send(frame)
+            await self.send_control(websocket, 'tcp_disconnected')
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Drop subscribers whose WebSocket has gone away
+            self.drop_subscriber(source, websocket, str(e))
 
-        connection = self.active_connections.get(websocket, {})
-        if 'tcp_writer' in connection:
-            writer = connection['tcp_writer']
-            writer.close()
-            await writer.wait_closed()
-            del connection['tcp_writer']
+    def drop_subscriber(self, source: SourceState, websocket, reason: str):
+        """Detach a client from a source without closing the source"""
+        connection = source.subscribers.pop(websocket, None)
+        if connection is None:
+            return
+        logger.info(f"Dropping subscriber of {source.ip}:{source.port}: {reason}")
+        connection.stop_sender()
+        if connection.connected:
+            connection.reset()
+            self._connected -= 1
 
-        connection.update({
-            'connected': False,
-            'ip': None,
-            'port': None
-        })
+        # The client's own cleanup won't see this source any more, so release
+        # it here; a reader dropping subscribers stops by itself once none are left
+        key = (source.ip, source.port)
+        if (not source.subscribers and self.sources.get(key) is source
+                and asyncio.current_task() is not source.reader_task):
+            del self.sources[key]  # Now, so a new client can't attach before it closes
+            self.spawn(self.release_source(source))
+
+    def spawn(self, coro):
+        """Run a coroutine in the background without awaiting it"""
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def encode_nmea(self, sentences: list, use_msgpack: bool) -> bytes:
+        """Encode NMEA sentences as one frame, batched if more than one"""
+        ts = _ts()
+        if len(sentences) > 1:
+            if use_msgpack:
+                return _ENCODER.encode(NmeaBatchFrame(sentences=sentences, timestamp=ts))
+            envelope = self._batch_envelope
+            envelope['sentences'] = sentences
+            envelope['timestamp'] = ts
+            return _dumps(envelope)
+
+        line = sentences[0]
+        if use_msgpack:
+            return _ENCODER.encode(NmeaFrame(sentence=line, timestamp=ts))
+        if len(line.translate(_JSON_UNSAFE)) == len(line):
+            # Nothing to escape, splice into the pre-serialized frame
+            # (a single join allocates once, chained + copies per operand)
+            return b''.join((_NMEA_PREFIX, line.encode(), _NMEA_MID,
+                             b'%d' % ts, _NMEA_SUFFIX))
+        envelope = self._nmea_envelope
+        envelope['sentence'] = line
+        envelope['timestamp'] = ts
+        return _dumps(envelope)
+
+    async def disconnect_tcp_source(self, websocket):
+        """Unsubscribe from TCP source, closing it if no other client uses it"""
+        connection = self.active_connections.get(websocket)
+        source = connection.source if connection is not None else None
+        if connection is not None:
+            connection.stop_sender()
+            if connection.connected:
+                connection.reset()
+                self._connected -= 1
+
+        if source is not None:
+            source.subscribers.pop(websocket, None)
+            # A source whose reader has already finished has unregistered itself
+            if not source.subscribers and self.sources.get((source.ip, source.port)) is source:
+                await self.release_source(source)
 
         try:
-            await websocket.send(json.dumps({
-                'type': 'disconnected',
-                'message': 'Disconnected from TCP source',
-                'timestamp': datetime.now().isoformat()
-            }))
+            await self.send_control(websocket, 'disconnected')
         except:
             pass  # WebSocket might be closed
 
+    async def release_source(self, source: SourceState):
+        """Close a TCP source that has no subscribers left"""
+        key = (source.ip, source.port)
+        if self.sources.get(key) is source:
+            del self.sources[key]
+        logger.info(f"Closing TCP source {source.ip}:{source.port}, no subscribers left")
+
+        if source.reader_task is not None:
+            # The reader closes the TCP connection on its way out
+            source.reader_task.cancel()
+            try:
+                await source.reader_task
+            except asyncio.CancelledError:
+                pass
+        else:
+            source.writer.close()
+            await source.writer.wait_closed()
+
     async def cleanup_connection(self, websocket):
         """Clean up WebSocket connection"""
         await self.disconnect_tcp_source(websocket)
@@ -220,14 +563,28 @@ class NMEAWebSocketProxy:
     async def send_error(self, websocket, message: str):
         """Send error message to WebSocket client"""
         try:
-            await websocket.send(json.dumps({
-                'type': 'error',
-                'message': message,
-                'timestamp': datetime.now().isoformat()
-            }))
+            await self.send_control(websocket, 'error', message=message)
         except:
             pass  # WebSocket might be closed
 
+    async def send_control(self, websocket, frame_type: str, **fields):
+        """Send a control frame in the client's negotiated wire format"""
+        if websocket.subprotocol == MSGPACK_SUBPROTOCOL:
+            if frame_type in _FIXED_FRAMES:
+                fields['message'] = _FIXED_FRAMES[frame_type]
+            payload = _ENCODER.encode(CtrlFrame(type=frame_type, timestamp=_ts(), **fields))
+        elif frame_type in _FIXED_FRAMES:
+            payload = _FIXED_PREFIXES[frame_type] + b'%d}' % _ts()
+        elif frame_type == 'connected':
+            payload = b''.join((_CONNECTED_PREFIX, _json_str(fields['ip']),
+                                _CONNECTED_SUFFIX % (fields['port'], _ts())))
+        elif frame_type == 'error':
+            payload = b''.join((_ERROR_PREFIX, _json_str(fields['message']),
+                                _ERROR_MID, b'%d' % _ts(), _ERROR_SUFFIX))
+        else:
+            raise ValueError(f"Unknown control frame type: {frame_type}")
+        await websocket.send(payload)
+
     async def start_server(self):
         """Start the WebSocket server"""
         logger.info(f"Starting NMEA WebSocket Proxy Server on port {self.ws_port}")
@@ -237,6 +594,10 @@ class NMEAWebSocketProxy:
             self.handle_client,
             "0.0.0.0",  # Listen on all interfaces
             self.ws_port,
+            select_subprotocol=_select_subprotocol,
+            compression=None,  # NMEA frames are too small for deflate to pay off
+            # None admits clients that send no Origin header, i.e. non-browser ones
+            origins=None if self._allow_all else (*self.allowed_origins, None),
             ping_interval=30,
             ping_timeout=10
         )
@@ -253,9 +614,8 @@ class NMEAWebSocketProxy:
         """Periodic stats logging"""
         while True:
             await asyncio.sleep(30)
-            active_count = len(self.active_connections)
-            connected_count = sum(1 for conn in self.active_connections.values() if conn.get('connected', False))
-            logger.info(f"Active WebSocket clients: {active_count}, TCP connections: {connected_count}")
+            logger.info(f"Active WebSocket clients: {len(self.active_connections)}, "
+                        f"TCP connections: {len(self.sources)}, subscribed clients: {self._connected}")
 
 def main():
     parser = argparse.ArgumentParser(description='NMEA AIS WebSocket Proxy Server')
@@ -275,8 +635,11 @@ def main():
     # Create and start proxy
     proxy = NMEAWebSocketProxy(ws_port=args.port, allowed_origins=allowed_origins)
     
+    # uvloop is a faster drop-in event loop, but has no Windows support
+    run = uvloop.run if uvloop is not None and sys.platform != 'win32' else asyncio.run
+    
     try:
-        asyncio.run(proxy.start_server())
+        run(proxy.start_server())
     except KeyboardInterrupt:
         logger.info("Shutting down proxy server...")
 